@@ -1,4 +1,3 @@
-from io import BytesIO
 from fastapi import APIRouter, Body, UploadFile, File, BackgroundTasks, Header
 from app.services.video_processor import process_video
 from app.services.audio_processor import process_audio
@@ -11,13 +10,19 @@ from app.core.task_tracker import task_tracker
 from typing import Optional
 import uuid
 import asyncio
+import aiohttp
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import os
-import time
-import json
+import tempfile
 
 MAX_RETRIES = 3
 RETRY_DELAY = 10
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1MB per read while streaming videos to disk
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+# No cap on the whole download, so large videos are not cut off; only stalled connections time out
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
 
 EMPOWERVERSE_API_KEY = settings.EMPOWERVERSE_API_KEY
 WEMOTIONS_API_KEY = settings.WEMOTIONS_API_KEY
@@ -25,20 +30,83 @@ EMPOWERVERSE_API_PATH = settings.EMPOWERVERSE_API_PATH
 WEMOTIONS_API_PATH = settings.WEMOTIONS_API_PATH
 VIDEO_DESCRIPTION_KEY = settings.VIDEO_DESCRIPTION_KEY
 
+# Metadata fields copied into the result only when the model returned them
+OPTIONAL_METADATA_FIELDS = (
+    "topics",
+    "entities",
+    "actions",
+    "emotions",
+    "visual_elements",
+    "audio_elements",
+    "genre",
+    "target_audience",
+    "quality_indicators",
+    "unique_identifiers",
+    "person_identity",
+    "other_person_identity",
+    "psychological_personality",
+)
+
 router = APIRouter()
 
+# Shared session so result callbacks reuse connections to the PHP APIs
+callback_session = requests.Session()
+callback_session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+callback_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
 analysis_results = {}
 
-async def analyze_video_task(video_content: bytes, video_filename: str, task_id: str, app_name: str, identifier: Optional[str] = None, is_christian_content: Optional[bool] = False):
-    audio_result = None
+async def download_video(file_url: str) -> Optional[str]:
+    """
+    Stream a remote video to a temporary file without blocking the event loop.
+    
+    Args:
+        file_url (str): URL of the video to download
+        
+    Returns:
+        Optional[str]: Path of the downloaded temporary file, or None if every attempt failed
+    """
+    async with aiohttp.ClientSession(timeout=DOWNLOAD_TIMEOUT) as session:
+        for attempt in range(MAX_RETRIES):
+            try:
+                async with session.get(file_url) as response:
+                    if response.status == 200:
+                        temp_path = None
+                        try:
+                            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
+                                temp_path = temp_file.name
+                                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                                    temp_file.write(chunk)
+                            return temp_path
+                        except Exception:
+                            if temp_path and os.path.exists(temp_path):
+                                os.unlink(temp_path)
+                            raise
+
+                    # Client errors (404, 403, ...) will not fix themselves; fail fast
+                    if response.status not in RETRYABLE_STATUS_CODES:
+                        logger.error(f"Download of {file_url} failed with status {response.status}")
+                        return None
+                    logger.warning(f"Attempt {attempt + 1}: download returned status {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                logger.warning(f"Attempt {attempt + 1}: download failed: {str(e)}")
+
+            if attempt < MAX_RETRIES - 1:
+                logger.info(f"Retrying download in {RETRY_DELAY} seconds...")
+                await asyncio.sleep(RETRY_DELAY)
+    return None
+
+async def analyze_video_task(video_path: str, video_filename: str, task_id: str, app_name: str, identifier: Optional[str] = None, is_christian_content: Optional[bool] = False):
     try:
         task_tracker.start_task(task_id)
         current_progress = 0
         
         # Run process_video and process_audio in parallel
         task_tracker.update_progress(task_id, "Starting parallel processing", current_progress)
-        video_task = asyncio.create_task(process_video(video_content, task_id))
-        audio_task = asyncio.create_task(process_audio(video_content, task_id))
+        video_task = asyncio.create_task(process_video(video_path, task_id))
+        audio_task = asyncio.create_task(process_audio(video_path, task_id))
         
         # Wait for both tasks to complete and handle their results
         video_result, audio_result = await asyncio.gather(video_task, audio_task)
@@ -53,7 +121,7 @@ async def analyze_video_task(video_content: bytes, video_filename: str, task_id:
         # Extract audio transcription from audio result
         audio_transcription = ''
         try:
-            if isinstance(audio_result, (list, tuple)) and audio_result:
+            if isinstance(audio_result, list) and audio_result:
                 first_result = audio_result[0]
                 if isinstance(first_result, dict):
                     audio_transcription = first_result.get('text', '')
@@ -99,44 +167,7 @@ async def analyze_video_task(video_content: bytes, video_filename: str, task_id:
         }
 
         # Add OpenAI-provided fields only if they are present
-        if "topics" in metadata:
-            result["topics"] = metadata["topics"]
-
-        if "entities" in metadata:
-            result["entities"] = metadata["entities"]
-
-        if "actions" in metadata:
-            result["actions"] = metadata["actions"]
-
-        if "emotions" in metadata:
-            result["emotions"] = metadata["emotions"]
-
-        if "visual_elements" in metadata:
-            result["visual_elements"] = metadata["visual_elements"]
-
-        if "audio_elements" in metadata:
-            result["audio_elements"] = metadata["audio_elements"]
-
-        if "genre" in metadata:
-            result["genre"] = metadata["genre"]
-
-        if "target_audience" in metadata:
-            result["target_audience"] = metadata["target_audience"]
-
-        if "quality_indicators" in metadata:
-            result["quality_indicators"] = metadata["quality_indicators"]
-
-        if "unique_identifiers" in metadata:
-            result["unique_identifiers"] = metadata["unique_identifiers"]
-
-        if "person_identity" in metadata:
-            result["person_identity"] = metadata["person_identity"]
-
-        if "other_person_identity" in metadata:
-            result["other_person_identity"] = metadata["other_person_identity"]
-
-        if "psychological_personality" in metadata:
-            result["psychological_personality"] = metadata["psychological_personality"]
+        result.update({key: metadata[key] for key in OPTIONAL_METADATA_FIELDS if key in metadata})
 
         if "no_of_person_in_video" in metadata:
             value = metadata["no_of_person_in_video"]
@@ -170,7 +201,7 @@ async def analyze_video_task(video_content: bytes, video_filename: str, task_id:
             if app_name == 'empowerverse':
                 api_url = f"{EMPOWERVERSE_API_PATH}/post/summary" 
             elif app_name == 'wemotions':
-                f"{WEMOTIONS_API_PATH}/post/summary"
+                api_url = f"{WEMOTIONS_API_PATH}/post/summary"
             
             # api_url = "http://localhost:8000/post/summary"
             payload = {
@@ -179,7 +210,13 @@ async def analyze_video_task(video_content: bytes, video_filename: str, task_id:
                 **result
             }
             
-            response = requests.post(api_url, json=payload)
+            # requests is blocking; keep the event loop free while the callback is in flight
+            response = await asyncio.to_thread(
+                callback_session.post,
+                api_url,
+                data=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"}
+            )
             if response.status_code == 200:
                 logger.info("Data sent to PHP API successfully.")
             else:
@@ -194,23 +231,13 @@ async def analyze_video_task(video_content: bytes, video_filename: str, task_id:
         task_tracker.complete_task(task_id, "error")
         analysis_results[task_id] = {"status": "error", "message": str(e)}
     finally:
-        # Clean up any remaining audio files if task status is either error or completed
-        task_data = task_tracker.tasks.get(task_id, {})
-        task_status = task_data.get("status")
-        
-        if task_status in ["error", "completed"]:
-            if audio_result and isinstance(audio_result, tuple) and len(audio_result) > 1:
-                audio_filename = audio_result[1]
-                if audio_filename and os.path.exists(audio_filename):
-                    try:
-                        os.unlink(audio_filename)
-                        logger.info(f"Cleaned up audio file: {audio_filename} (Task status: {task_status})")
-                    except Exception as e:
-                        logger.error(f"Error cleaning up audio file: {str(e)}")
-                else:
-                    logger.info(f"No audio file to clean up for task {task_id} (Task status: {task_status})")
-        else:
-            logger.info(f"Skipping audio cleanup for task {task_id} (Task status: {task_status})")
+        # The downloaded/uploaded video is no longer needed once both pipelines are done
+        if video_path and os.path.exists(video_path):
+            try:
+                os.unlink(video_path)
+                logger.info(f"Cleaned up video file: {video_path}")
+            except Exception as e:
+                logger.error(f"Error cleaning up video file: {str(e)}")
 
 @router.post("/analyze_video")
 async def analyze_video(background_tasks: BackgroundTasks, app_name: str, video: UploadFile = File(None), file_url: Optional[str] = Query(None), identifier: Optional[str] = Query(None), is_christian_content: Optional[bool] = Query(False)):
@@ -219,31 +246,31 @@ async def analyze_video(background_tasks: BackgroundTasks, app_name: str, video:
         progress_bar = 0
 
         if file_url:
-            for attempt in range(MAX_RETRIES):
-                response = requests.get(file_url)
-                if response.status_code == 200:
-                    response.raise_for_status()
-                    file_content = response.content
-                    filename = os.path.basename(file_url)
-
-                    progress_bar += 1
-                    background_tasks.add_task(analyze_video_task, file_content, filename, task_id, app_name, identifier, is_christian_content)
-                    break
+            video_path = await download_video(file_url)
+            if video_path:
+                filename = os.path.basename(file_url)
 
-                print(f"Attempt {attempt + 1}: Result not ready. Retrying in {RETRY_DELAY} seconds...")
-                time.sleep(RETRY_DELAY)
+                progress_bar += 1
+                background_tasks.add_task(analyze_video_task, video_path, filename, task_id, app_name, identifier, is_christian_content)
         
         elif video:
-            video_content = await video.read()
+            # Copy the upload to disk chunk by chunk instead of holding it all in memory
+            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
+                video_path = temp_file.name
+                while True:
+                    chunk = await video.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    temp_file.write(chunk)
             progress_bar += 1
-            background_tasks.add_task(analyze_video_task, video_content, video.filename, task_id, identifier, is_christian_content)
+            background_tasks.add_task(analyze_video_task, video_path, video.filename, task_id, app_name, identifier, is_christian_content)
         
         return {
             "message": "Video analysis started.",
             "task_id": task_id
         }
     
-    except requests.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logger.error(f"Error during video analysis: {str(e)}")
         return {"error": "Failed to process video"}    
 
@@ -269,7 +296,7 @@ async def share_url(
     data: dict = Body(...)
 ):
     url = data.get('url')
-    identifier = data.get('identifier'),
+    identifier = data.get('identifier')
     is_christian_content = data.get('is_christian_content', False)
 
      # Check if flic_token is valid for either API key
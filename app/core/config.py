@@ -9,6 +9,14 @@ class Settings(BaseSettings):
     EMPOWERVERSE_API_PATH: str
     WEMOTIONS_API_PATH: str
     VIDEO_DESCRIPTION_KEY: str
+    WHISPER_MAX_CONCURRENCY: int = 5
+    GPT_MAX_CONCURRENCY: int = 5
+    MODERATION_MAX_CONCURRENCY: int = 10
+    OPENAI_REQUESTS_PER_MINUTE: int = 500
+    MODERATION_REQUESTS_PER_MINUTE: int = 1000
+    OPENAI_MAX_RETRIES: int = 5
+    VIDEO_HW_ACCELERATION: bool = False
+    LOG_LEVEL: str = "INFO"
 
     class Config:
         env_file = ".env"
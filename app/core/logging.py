@@ -1,8 +1,9 @@
 import logging
+from app.core.config import settings
 
 def setup_logging():
     logging.basicConfig(
-        level=logging.INFO,
+        level=settings.LOG_LEVEL.upper(),
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     )
 
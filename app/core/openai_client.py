@@ -0,0 +1,19 @@
+import httpx
+from openai import AsyncOpenAI
+from app.core.config import settings
+
+# One pooled HTTP/2 connection set shared by every service, so concurrent
+# transcription and vision requests reuse TLS connections instead of opening new ones
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    timeout=httpx.Timeout(600.0, connect=10.0),
+)
+
+# The SDK retries connection errors, 408/409/429 and 5xx responses with exponential
+# backoff and jitter, honouring retry-after; only the attempt count is configured here
+client = AsyncOpenAI(
+    api_key=settings.OPENAI_API_KEY,
+    http_client=http_client,
+    max_retries=settings.OPENAI_MAX_RETRIES,
+)
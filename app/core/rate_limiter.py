@@ -0,0 +1,41 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from app.core.config import settings
+
+class RateLimiter:
+    """
+    Bounds OpenAI chat/vision calls both by the number of requests in flight and
+    by requests per minute, so concurrent fan-out stays under the account quota
+    instead of tripping 429s and retrying.
+    """
+    def __init__(self, max_concurrency: int, requests_per_minute: int):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._rate = requests_per_minute / 60.0  # tokens refilled per second
+        self._capacity = float(max_concurrency)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    async def _take_token(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._semaphore:
+            await self._take_token()
+            yield
+
+# Shared by every service that calls the chat completions endpoints
+openai_limiter = RateLimiter(settings.GPT_MAX_CONCURRENCY, settings.OPENAI_REQUESTS_PER_MINUTE)
+
+# The moderation endpoint is free and has its own, larger quota
+moderation_limiter = RateLimiter(settings.MODERATION_MAX_CONCURRENCY, settings.MODERATION_REQUESTS_PER_MINUTE)
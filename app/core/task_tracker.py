@@ -1,42 +1,76 @@
-import json
+import logging
+import orjson
 import time
 from datetime import datetime
 import os
-from typing import Dict, Any
+import tempfile
+from typing import Dict, Any, Optional, Tuple
+from app.core.logging import logger
+
+SAVE_INTERVAL = 2.0  # Minimum seconds between buffered writes of the data file
 
 class TaskTracker:
     def __init__(self, data_file: str = "docs/data_record.json"):
         self.data_file = data_file
+        # Create the data directory once up front rather than on every save
+        self._data_dir = os.path.dirname(self.data_file) or "."
+        os.makedirs(self._data_dir, exist_ok=True)
         self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        # Monotonic start times keyed by (task_id, step_name); step_name is None for the task itself
+        self._clock: Dict[Tuple[str, Optional[str]], float] = {}
+        # Last whole percentage reported through update_progress_throttled, per task
+        self._last_reported: Dict[str, int] = {}
         self.load_data()
 
     def load_data(self):
         """Load existing data from the JSON file."""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.tasks = json.load(f)
+                with open(self.data_file, 'rb') as f:
+                    self.tasks = orjson.loads(f.read())
         except Exception as e:
             print(f"Error loading data: {str(e)}")
             self.tasks = {}
 
     def save_data(self):
         """Save current data to the JSON file."""
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.tasks, f, indent=2)
+            # Write to a sibling temp file and swap it in atomically, so a concurrent
+            # reader or writer never sees a half-written file
+            fd, temp_path = tempfile.mkstemp(dir=self._data_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(orjson.dumps(self.tasks, option=orjson.OPT_INDENT_2))
+                os.replace(temp_path, self.data_file)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+            self._dirty = False
+            self._last_save = time.monotonic()
         except Exception as e:
             print(f"Error saving data: {str(e)}")
 
-    def _print_progress_indicator(self, message: str, timing_info: str = None):
-        """Print a visual progress indicator with timing information."""
+    def _mark_dirty(self):
+        """Record pending changes and write them out at most once per SAVE_INTERVAL."""
+        self._dirty = True
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self.save_data()
+
+    def flush(self):
+        """Write any buffered changes to the JSON file immediately."""
+        if self._dirty:
+            self.save_data()
+
+    def _log_progress_indicator(self, message: str, timing_info: str = None):
+        """Log a visual progress indicator with timing information at debug level."""
         separator = "=" * 30
-        print(f"\n{separator}")
-        print(message)
+        lines = [separator, message]
         if timing_info:
-            print(timing_info)
-        print(f"{separator}\n")
+            lines.append(timing_info)
+        lines.append(separator)
+        logger.debug("\n".join(lines))
 
     def _calculate_duration(self, start_time: str, end_time: str = None) -> float:
         """Calculate duration between two timestamps."""
@@ -44,9 +78,18 @@ class TaskTracker:
         end = datetime.fromisoformat(end_time) if end_time else datetime.now()
         return (end - start).total_seconds()
 
+    def _elapsed(self, task_id: str, step_name: Optional[str], start_time: str) -> float:
+        """Seconds since a task or step started, falling back to its ISO timestamp if untracked."""
+        start = self._clock.get((task_id, step_name))
+        if start is None:
+            # Tasks loaded from a previous run only have their recorded timestamps
+            return self._calculate_duration(start_time)
+        return time.monotonic() - start
+
     def start_task(self, task_id: str):
         """Initialize a new task with timing and progress data."""
         start_time = datetime.now().isoformat()
+        self._clock[(task_id, None)] = time.monotonic()
         self.tasks[task_id] = {
             "start_time": start_time,
             "steps": {},
@@ -58,21 +101,22 @@ class TaskTracker:
                 "steps_timing": {}
             }
         }
-        self._print_progress_indicator(
-            f"Starting new task: {task_id}",
-            f"Start Time: {datetime.fromisoformat(start_time).strftime('%Y-%m-%d %H:%M:%S')}"
-        )
-        self.save_data()
+        if logger.isEnabledFor(logging.DEBUG):
+            self._log_progress_indicator(
+                f"Starting new task: {task_id}",
+                f"Start Time: {datetime.fromisoformat(start_time).strftime('%Y-%m-%d %H:%M:%S')}"
+            )
+        self._mark_dirty()
 
     def update_progress(self, task_id: str, step_name: str, progress: int):
         """Update progress for a specific step in the task."""
         if task_id not in self.tasks:
             self.start_task(task_id)
 
-        current_time = datetime.now().isoformat()
-        
         # Initialize or update step information
         if step_name not in self.tasks[task_id]["steps"]:
+            current_time = datetime.now().isoformat()
+            self._clock[(task_id, step_name)] = time.monotonic()
             self.tasks[task_id]["steps"][step_name] = {
                 "start_time": current_time,
                 "progress": progress
@@ -83,19 +127,26 @@ class TaskTracker:
         else:
             self.tasks[task_id]["steps"][step_name]["progress"] = progress
 
-        # Calculate timing information for the step
-        step_timing = self.tasks[task_id]["timing"]["steps_timing"][step_name]
-        duration = self._calculate_duration(step_timing["start_time"])
-        timing_info = f"Step Duration: {duration:.2f} seconds"
-
-        self._print_progress_indicator(
-            f"Progress Update: {step_name} ({progress}%)",
-            timing_info
-        )
+        # Calculate timing information for the step only when it will be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            step_timing = self.tasks[task_id]["timing"]["steps_timing"][step_name]
+            duration = self._elapsed(task_id, step_name, step_timing["start_time"])
+            self._log_progress_indicator(
+                f"Progress Update: {step_name} ({progress}%)",
+                f"Step Duration: {duration:.2f} seconds"
+            )
 
         # Update overall progress
         self.tasks[task_id]["current_progress"] = progress
-        self.save_data()
+        self._mark_dirty()
+
+    def update_progress_throttled(self, task_id: str, step_name: str, progress: float):
+        """Update progress only when it reaches a new whole percentage, for high-frequency fan-out callers."""
+        whole = int(progress)
+        if whole <= self._last_reported.get(task_id, -1):
+            return
+        self._last_reported[task_id] = whole
+        self.update_progress(task_id, step_name, progress)
 
     def complete_step(self, task_id: str, step_name: str):
         """Mark a step as completed and record its completion time."""
@@ -108,14 +159,15 @@ class TaskTracker:
             
             # Calculate duration
             start_time = self.tasks[task_id]["timing"]["steps_timing"][step_name]["start_time"]
-            duration = self._calculate_duration(start_time, current_time)
+            duration = self._elapsed(task_id, step_name, start_time)
             self.tasks[task_id]["timing"]["steps_timing"][step_name]["duration_seconds"] = duration
 
-            self._print_progress_indicator(
-                f"Completed step: {step_name}",
-                f"Step Duration: {duration:.2f} seconds"
-            )
-            self.save_data()
+            if logger.isEnabledFor(logging.DEBUG):
+                self._log_progress_indicator(
+                    f"Completed step: {step_name}",
+                    f"Step Duration: {duration:.2f} seconds"
+                )
+            self._mark_dirty()
 
     def complete_task(self, task_id: str, status: str = "completed"):
         """Mark a task as completed and calculate total duration."""
@@ -125,27 +177,28 @@ class TaskTracker:
             self.tasks[task_id]["status"] = status
             
             # Calculate total duration
-            total_duration = self._calculate_duration(
-                self.tasks[task_id]["start_time"],
-                end_time
-            )
+            total_duration = self._elapsed(task_id, None, self.tasks[task_id]["start_time"])
             self.tasks[task_id]["timing"]["end_time"] = end_time
             self.tasks[task_id]["timing"]["total_duration_seconds"] = total_duration
             
             # Calculate step durations
             step_durations = {}
             for step, timing in self.tasks[task_id]["timing"]["steps_timing"].items():
-                if "end_time" in timing:
-                    duration = self._calculate_duration(timing["start_time"], timing["end_time"])
+                if "duration_seconds" in timing:
+                    duration = timing["duration_seconds"]
                 else:
-                    duration = self._calculate_duration(timing["start_time"], end_time)
+                    duration = self._elapsed(task_id, step, timing["start_time"])
                 step_durations[step] = duration
-
-            # Print final summary
-            self._print_progress_indicator(
-                f"Task {task_id} {status}",
-                self._format_task_summary(task_id, status, total_duration, step_durations)
-            )
+                self._clock.pop((task_id, step), None)
+            self._clock.pop((task_id, None), None)
+            self._last_reported.pop(task_id, None)
+
+            # Log final summary
+            if logger.isEnabledFor(logging.DEBUG):
+                self._log_progress_indicator(
+                    f"Task {task_id} {status}",
+                    self._format_task_summary(task_id, status, total_duration, step_durations)
+                )
             
             self.tasks[task_id]["current_progress"] = 100
             self.save_data()
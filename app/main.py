@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from app.api.routes import video_analysis
 from app.core.config import settings
 from app.core.logging import setup_logging
+from app.core.task_tracker import task_tracker
+from app.core.openai_client import http_client
 
 app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
 
@@ -9,6 +11,11 @@ app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
 async def startup_event():
     setup_logging()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    task_tracker.flush()
+    await http_client.aclose()
+
 app.include_router(video_analysis.router, prefix="/api/v1")
 
 if __name__ == "__main__":
@@ -1,75 +1,114 @@
-import os
-import time
-from moviepy.editor import VideoFileClip
-from openai import AsyncOpenAI
-import tempfile
 from app.core.logging import logger
-from datetime import datetime
 from app.core.config import settings
+from app.core.openai_client import client
 from app.core.task_tracker import task_tracker
-from pydub import AudioSegment
-from typing import Tuple, List, Optional
-import math
+from app.core.cache import LRUCache
+from typing import Tuple, List
 import re
-import json
+import orjson
 import asyncio
+import hashlib
 
-OUTPUT_FOLDER = os.path.abspath("video_analysis_output")
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 MAX_CHUNK_SIZE = 24 * 1024 * 1024  # 24MB to stay safely under the 25MB limit
 CHUNK_DURATION = 10 * 60 * 1000  # 10 minutes in milliseconds
+SAMPLE_RATE = 16000  # Whisper resamples to 16kHz mono internally
 
-# NSFW content detection patterns
-NSFW_PATTERNS = [
-    r'\b(?:sex|porn|xxx|adult|nude|naked|explicit|nsfw)\b',
-    r'\b(?:masturbat(?:e|ion)|orgasm|erotic)\b',
-    r'\b(?:breast|boob|tit|ass|penis|vagina|dick|cock|pussy)\b',
-    r'\b(?:fuck|shit|bitch|cunt|whore|slut)\b',
-    r'\b(?:strip(?:ping|per)|escort|prostitut(?:e|ion))\b',
-    r'\b(?:hentai|rule34|onlyfans)\b'
-]
+# Transcriptions keyed by a hash of the chunk audio, so resubmitted videos skip Whisper
+transcription_cache = LRUCache(maxsize=256, ttl=24 * 60 * 60)
+# GPT safety verdicts keyed by a hash of the checked text
+safety_cache = LRUCache(maxsize=2048, ttl=24 * 60 * 60)
 
-async def process_audio(video_content: bytes, task_id: str = None) -> Tuple[List[dict], Optional[str]]:
+# NSFW content detection keywords, matched against whole words of the text
+NSFW_WORDS = frozenset({
+    "sex", "porn", "xxx", "adult", "nude", "naked", "explicit", "nsfw",
+    "masturbate", "masturbation", "orgasm", "erotic",
+    "breast", "boob", "tit", "ass", "penis", "vagina", "dick", "cock", "pussy",
+    "fuck", "shit", "bitch", "cunt", "whore", "slut",
+    "stripping", "stripper", "escort", "prostitute", "prostitution",
+    "hentai", "rule34", "onlyfans",
+})
+WORD_RE = re.compile(r"\w+")
+
+SAFETY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are a very strict content moderator. Your task is to identify any inappropriate, 
+    adult, sexual, NSFW, or suggestive content in the text. Be extremely conservative - if there's any doubt,
+    mark it as inappropriate. Return a JSON object with:
+    {
+        "is_safe": boolean,
+        "warnings": [list of specific warnings],
+        "reason": "detailed explanation"
+    }"""
+}
+
+async def _probe_duration(video_path: str) -> float:
+    """
+    Return the container duration of a media file in seconds using ffprobe.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        video_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {stderr.decode(errors='replace').strip()}")
+    return float(stdout.decode().strip())
+
+async def _extract_audio_chunk(video_path: str, start_ms: int, duration_ms: int) -> bytes:
+    """
+    Decode one slice of the audio track straight to in-memory WAV bytes.
+    
+    Audio is downmixed to 16kHz mono, the rate Whisper works at internally,
+    which keeps each 10 minute chunk well under the upload limit.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-ss", str(start_ms / 1000), "-t", str(duration_ms / 1000),
+        "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "wav", "pipe:1",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+    return stdout
+
+async def _transcribe_chunk(audio_data: bytes) -> str:
+    """
+    Transcribe one in-memory WAV chunk.
+    Identical audio is served from the transcription cache.
     """
-    Process audio from video content, handling large files by splitting into chunks.
+    cache_key = hashlib.blake2b(audio_data, digest_size=16).hexdigest()
+    cached_text = transcription_cache.get(cache_key)
+    if cached_text is not None:
+        logger.info(f"Using cached transcription for chunk {cache_key}")
+        return cached_text
+    
+    transcription = await client.audio.transcriptions.create(
+        model="whisper-1",
+        file=("chunk.wav", audio_data, "audio/wav")
+    )
+    transcription_cache.set(cache_key, transcription.text)
+    return transcription.text
+
+async def process_audio(video_path: str, task_id: str = None) -> List[dict]:
     """
-    temp_video_file = None
-    temp_audio_file = None
-    output_folder = "video_analysis_output"
+    Process audio from a video file, handling large files by splitting into chunks.
     
+    Each chunk is decoded by ffmpeg directly into memory and uploaded from there,
+    so no intermediate WAV files are written to disk.
+    """
     try:
-        # Create output folder if it doesn't exist
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-            logger.info(f"Output folder created/confirmed: {os.path.abspath(output_folder)}")
-        
-        # Save video content to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-            temp_file.write(video_content)
-            temp_video_file = temp_file.name
-        logger.info(f"Temporary video file created at: {temp_video_file}")
-        
-        if task_id:
-            task_tracker.update_progress(task_id, "Video file saved", 10)
-        
-        # Load video and extract audio
-        video = AudioSegment.from_file(temp_video_file)
+        audio_length = int(await _probe_duration(video_path) * 1000)
         if task_id:
             task_tracker.update_progress(task_id, "Video loaded for audio extraction", 15)
         
-        # Save extracted audio
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        audio_filename = os.path.join(output_folder, f"extracted_audio_{timestamp}.wav")
-        video.export(audio_filename, format="wav")
-        logger.info(f"Saved extracted audio locally: {audio_filename}")
-        
-        if task_id:
-            task_tracker.update_progress(task_id, "Audio extracted and saved", 25)
-        
-        # Get file info
-        file_size = os.path.getsize(audio_filename)
-        logger.info(f"Audio file size: {file_size} bytes")
-        
         # Process audio in chunks if necessary
         if task_id:
             task_tracker.update_progress(task_id, "Starting audio transcription", 30)
@@ -77,83 +116,65 @@ async def process_audio(video_content: bytes, task_id: str = None) -> Tuple[List
         logger.info("Transcribing audio using OpenAI Whisper API...")
         
         # Calculate number of chunks needed
-        audio_length = len(video)
-        num_chunks = math.ceil(audio_length / CHUNK_DURATION)
+        num_chunks = max(1, (audio_length + CHUNK_DURATION - 1) // CHUNK_DURATION)
         logger.info(f"Audio length: {audio_length}ms, splitting into {num_chunks} chunks")
         
-        # Process audio in chunks
-        transcriptions = []
-        chunk_files = []
+        # Extract and transcribe chunks in parallel, bounded to stay within the API rate limits
+        semaphore = asyncio.Semaphore(settings.WHISPER_MAX_CONCURRENCY)
+        completed = 0
         
-        try:
-            for i in range(num_chunks):
-                start_time = i * CHUNK_DURATION
-                end_time = min((i + 1) * CHUNK_DURATION, audio_length)
-                
-                # Extract chunk
-                chunk = video[start_time:end_time]
-                
-                # Save chunk to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_chunk:
-                    chunk.export(temp_chunk.name, format="wav")
-                    chunk_files.append(temp_chunk.name)
-                    
-                    # Check chunk size
-                    chunk_size = os.path.getsize(temp_chunk.name)
-                    logger.info(f"Chunk {i+1}/{num_chunks} size: {chunk_size} bytes")
-                    
-                    if chunk_size > MAX_CHUNK_SIZE:
-                        raise ValueError(f"Chunk {i+1} size ({chunk_size} bytes) exceeds maximum allowed size ({MAX_CHUNK_SIZE} bytes)")
-                    
-                    # Transcribe chunk
-                    with open(temp_chunk.name, "rb") as audio_file:
-                        transcription = await client.audio.transcriptions.create(
-                            model="whisper-1",
-                            file=audio_file
-                        )
-                        transcriptions.append(transcription.text)
-                        
-                    logger.info(f"Chunk {i+1}/{num_chunks} transcribed successfully")
-                    
-                    if task_id:
-                        progress = 30 + (i + 1) * (35 - 30) / num_chunks
-                        task_tracker.update_progress(task_id, f"Transcribed chunk {i+1}/{num_chunks}", progress)
-            
-            # Combine all transcriptions
-            combined_text = " ".join(transcriptions)
-            result = [{"text": combined_text}]
+        async def transcribe(index: int) -> str:
+            nonlocal completed
+            start_time = index * CHUNK_DURATION
+            duration = min(CHUNK_DURATION, audio_length - start_time)
             
+            # Hold the slot across extraction too, so only a bounded number of ffmpeg
+            # processes run and WAV buffers are held at any one time
+            async with semaphore:
+                audio_data = await _extract_audio_chunk(video_path, start_time, duration)
+                chunk_size = len(audio_data)
+                logger.info(f"Chunk {index+1}/{num_chunks} size: {chunk_size} bytes")
+                if chunk_size > MAX_CHUNK_SIZE:
+                    raise ValueError(f"Chunk {index+1} size ({chunk_size} bytes) exceeds maximum allowed size ({MAX_CHUNK_SIZE} bytes)")
+                
+                text = await _transcribe_chunk(audio_data)
+            completed += 1
+            logger.info(f"Chunk {index+1}/{num_chunks} transcribed successfully")
             if task_id:
-                task_tracker.update_progress(task_id, "Audio transcription completed", 35)
-                task_tracker.update_progress(task_id, "Audio processing completed", 40)
-            
-            return result, audio_filename
-            
-        finally:
-            # Clean up chunk files
-            for chunk_file in chunk_files:
-                if os.path.exists(chunk_file):
-                    try:
-                        os.unlink(chunk_file)
-                        logger.info(f"Cleaned up chunk file: {chunk_file}")
-                    except Exception as e:
-                        logger.error(f"Error cleaning up chunk file: {str(e)}")
+                progress = 30 + completed * (35 - 30) / num_chunks
+                task_tracker.update_progress_throttled(task_id, f"Transcribed chunk {completed}/{num_chunks}", progress)
+            return text
+        
+        results = await asyncio.gather(
+            *(transcribe(i) for i in range(num_chunks)),
+            return_exceptions=True
+        )
+        
+        transcriptions = []
+        for i, text in enumerate(results):
+            if isinstance(text, Exception):
+                logger.error(f"Error transcribing chunk {i+1}/{num_chunks}: {str(text)}")
+            else:
+                transcriptions.append(text)
+        if not transcriptions:
+            raise results[0]
+        
+        # Combine all transcriptions
+        combined_text = " ".join(transcriptions)
+        result = [{"text": combined_text}]
+        
+        if task_id:
+            task_tracker.update_progress(task_id, "Audio transcription completed", 35)
+            task_tracker.update_progress(task_id, "Audio processing completed", 40)
+        
+        return result
         
     except Exception as e:
         error_msg = f"Error in audio processing: {str(e)}"
         logger.error(error_msg)
         if task_id:
             task_tracker.update_progress(task_id, f"Error: {error_msg}", 35)
-        return [{"error": error_msg}], None
-        
-    finally:
-        # Clean up temporary files
-        if temp_video_file and os.path.exists(temp_video_file):
-            try:
-                os.unlink(temp_video_file)
-                logger.info(f"Cleaned up temporary video file: {temp_video_file}")
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary video file: {str(e)}")
+        return [{"error": error_msg}]
 
 async def check_content_safety(text: str) -> Tuple[bool, List[str]]:
     """
@@ -163,30 +184,27 @@ async def check_content_safety(text: str) -> Tuple[bool, List[str]]:
     try:
         # First check for explicit patterns
         warnings = []
-        for pattern in NSFW_PATTERNS:
-            matches = re.finditer(pattern, text.lower())
-            for match in matches:
-                warnings.append(f"Detected inappropriate content: {match.group()}")
+        for match in WORD_RE.finditer(text):
+            word = match.group().lower()
+            if word in NSFW_WORDS:
+                warnings.append(f"Detected inappropriate content: {word}")
         
         if warnings:
             return False, warnings
 
+        # Reuse the verdict for text that has already been checked
+        cache_key = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        cached = safety_cache.get(cache_key)
+        if cached is not None:
+            is_safe, cached_warnings = cached
+            return is_safe, list(cached_warnings)
+
         # Use OpenAI to check for more subtle NSFW content
         try:
             response = await client.chat.completions.create(
                 model="gpt-4",
                 messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a very strict content moderator. Your task is to identify any inappropriate, 
-                        adult, sexual, NSFW, or suggestive content in the text. Be extremely conservative - if there's any doubt,
-                        mark it as inappropriate. Return a JSON object with:
-                        {
-                            "is_safe": boolean,
-                            "warnings": [list of specific warnings],
-                            "reason": "detailed explanation"
-                        }"""
-                    },
+                    SAFETY_SYSTEM_MESSAGE,
                     {
                         "role": "user",
                         "content": text
@@ -197,20 +215,22 @@ async def check_content_safety(text: str) -> Tuple[bool, List[str]]:
                 timeout=30  # 30 seconds timeout
             )
             
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             if not result.get("is_safe", False):
                 warnings.extend(result.get("warnings", []))
                 reason = result.get("reason", "Content flagged as inappropriate")
                 if reason and reason not in warnings:
                     warnings.append(reason)
+                safety_cache.set(cache_key, (False, tuple(warnings)))
                 return False, warnings
             
+            safety_cache.set(cache_key, (True, ()))
             return True, []
             
         except asyncio.TimeoutError:
             logger.error("Timeout during content safety check")
             return False, ["Content safety check timed out"]
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error parsing GPT response: {str(e)}")
             return False, ["Unable to verify content safety"]
         except Exception as e:
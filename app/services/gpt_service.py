@@ -1,11 +1,147 @@
 import base64
-from openai import AsyncOpenAI
+import asyncio
+import orjson
 from app.core.task_tracker import task_tracker
-from app.core.config import settings
+from app.core.openai_client import client
+from app.core.rate_limiter import openai_limiter
 from app.core.logging import logger
 from typing import List
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+GRID_ANALYSIS_PROMPT = """
+Analyze this series of video frames with particular attention to Christian themes and NSFW content:
+
+Provide a comprehensive description focusing on:
+1. The speaker's actions and expressions
+2. Any text overlays or icons and their significance
+3. Visual elements and their significance
+4. The overall theme and message visible in these frames
+5. Number of human faces visible
+6. Gender identification of visible individuals
+7. Personality traits and demeanor of main individuals
+8. Notable interactions or expressions
+9. Visual progression and scene changes
+10. Any identifiable individuals or notable features
+11. Religious or spiritual elements present (crosses, churches, religious symbols, etc.)
+12. Any visible scripture references or biblical content
+13. Signs of worship, prayer, or religious activities
+14. Evidence of Christian values (love, service, humility, etc.)
+15. Any religious gatherings or community events
+
+Focus on visual analysis only. Describe the progression naturally without mentioning grid layout.
+Pay special attention to elements that indicate Christian content or messaging.
+"""
+# Shared, read-only text part sent with every grid image
+GRID_ANALYSIS_TEXT_PART = {"type": "text", "text": GRID_ANALYSIS_PROMPT}
+
+# Grids described per request; several images share one round trip and one copy of the prompt
+GRID_BATCH_SIZE = 4
+GRID_BATCH_INSTRUCTIONS = """
+You are given {count} images, each showing frames from a consecutive segment of the same video.
+Describe each image separately following the instructions above, and return a JSON object of the form
+{{"descriptions": ["description of image 1", "description of image 2", ...]}}
+with exactly one entry per image, in the order the images were given.
+"""
+
+# Static instructions for the final description, sent as the system message so they stay
+# separate from the per-video data in the user message
+FINAL_DESCRIPTION_MAX_TOKENS = 1500
+FINAL_PROMPT_INSTRUCTIONS = """
+Based on the video segment descriptions and audio transcription provided by the user, provide a comprehensive analysis.
+
+Provide a unified description that includes:
+1. The speaker's actions and expressions
+2. Any text overlays or icons and their significance
+3. How the visuals complement or illustrate the audio content
+4. The overall theme and message of the video
+5. No of human being face visible in the video
+6. Count the number of visible human faces in the video
+7. Assess the personality traits of the main individual featured, including insights into their demeanor and engagement
+8. Identify the gender of the main speaker at the beginning of the video, as well as the genders of all other individuals present
+9. If possible, provide names or identities of other individuals featured in the video
+10. Determine whether the video contains visible faces throughout its duration
+11. Calculate the exact duration of the audio and the total length of the video based on automated processing
+12. Describe the speaker's actions, expressions, and any notable interactions
+13. Speaker Identification: If there are multiple speakers, indicate who is speaking at each point
+14. Use paragraph breaks for different speakers or topics to enhance readability
+
+Additionally, analyze the Christian content aspects:
+15. Identify any religious symbols, scripture references, or biblical content
+16. Note any expressions of faith, prayer, or worship
+17. Assess if the content aligns with Christian values (love, service, humility, etc.)
+18. Identify any religious gatherings or community events
+19. Evaluate if the content promotes Christian teachings or messages
+20. Determine if the content reflects Christian social media principles:
+    - Authenticity over perfection
+    - Focus on serving others rather than self-promotion
+    - Building genuine connections and community
+    - Sharing truth with grace
+    - Using platform for Kingdom purposes
+    - Maintaining depth over superficiality
+    - Promoting unity and understanding
+    - Demonstrating Christian values in presentation and message
+
+Based on these aspects, include a clear assessment of whether this can be classified as Christian content.
+Do not mention anything about a grid or layout of the images.
+Provide a natural, flowing narrative that combines all these elements into a coherent analysis.
+"""
+
+def _image_part(base64_image: str) -> dict:
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/jpeg;base64,{base64_image}"
+        }
+    }
+
+async def _describe_grid(base64_image: str) -> str:
+    """Describe a single grid image."""
+    async with openai_limiter.acquire():
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [GRID_ANALYSIS_TEXT_PART, _image_part(base64_image)]
+                }
+            ],
+            max_tokens=500
+        )
+    return response.choices[0].message.content.strip()
+
+async def _describe_grid_batch(batch: List[str]) -> List[str]:
+    """
+    Describe several grid images with one request, falling back to one request
+    per image if the model does not return one description per image.
+    """
+    if len(batch) == 1:
+        return [await _describe_grid(batch[0])]
+    
+    async with openai_limiter.acquire():
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        GRID_ANALYSIS_TEXT_PART,
+                        {"type": "text", "text": GRID_BATCH_INSTRUCTIONS.format(count=len(batch))},
+                        *(_image_part(base64_image) for base64_image in batch)
+                    ]
+                }
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=500 * len(batch)
+        )
+    
+    try:
+        descriptions = orjson.loads(response.choices[0].message.content)["descriptions"]
+        if len(descriptions) == len(batch) and all(isinstance(d, str) for d in descriptions):
+            return [d.strip() for d in descriptions]
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        logger.warning(f"Could not parse batched grid descriptions: {str(e)}")
+    
+    logger.warning("Batched grid response did not match the batch; describing images individually")
+    return list(await asyncio.gather(*(_describe_grid(base64_image) for base64_image in batch)))
 
 async def analyze_grid_images(base64_images: List[str], task_id: str = None) -> List[str]:
     """
@@ -19,59 +155,23 @@ async def analyze_grid_images(base64_images: List[str], task_id: str = None) ->
         List[str]: List of descriptions for each grid
     """
     try:
-        descriptions = []
         total_images = len(base64_images)
+        completed = 0
         
-        for idx, base64_image in enumerate(base64_images, 1):
+        async def describe(batch: List[str]) -> List[str]:
+            nonlocal completed
+            batch_descriptions = await _describe_grid_batch(batch)
+            completed += len(batch)
             if task_id:
-                progress = int(65 + (idx / total_images * 5))  # Progress from 65% to 70%
-                task_tracker.update_progress(task_id, f"Analyzing grid image {idx}/{total_images}", progress)
-                
-            prompt = """
-            Analyze this series of video frames with particular attention to Christian themes and NSFW content:
-
-            Provide a comprehensive description focusing on:
-            1. The speaker's actions and expressions
-            2. Any text overlays or icons and their significance
-            3. Visual elements and their significance
-            4. The overall theme and message visible in these frames
-            5. Number of human faces visible
-            6. Gender identification of visible individuals
-            7. Personality traits and demeanor of main individuals
-            8. Notable interactions or expressions
-            9. Visual progression and scene changes
-            10. Any identifiable individuals or notable features
-            11. Religious or spiritual elements present (crosses, churches, religious symbols, etc.)
-            12. Any visible scripture references or biblical content
-            13. Signs of worship, prayer, or religious activities
-            14. Evidence of Christian values (love, service, humility, etc.)
-            15. Any religious gatherings or community events
-
-            Focus on visual analysis only. Describe the progression naturally without mentioning grid layout.
-            Pay special attention to elements that indicate Christian content or messaging.
-            """
-
-            response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=500
-            )
-            descriptions.append(response.choices[0].message.content.strip())
+                progress = int(65 + (completed / total_images * 5))  # Progress from 65% to 70%
+                task_tracker.update_progress_throttled(task_id, f"Analyzed grid image {completed}/{total_images}", progress)
+            return batch_descriptions
+        
+        # Describe batches concurrently within the shared rate limit; gather keeps grid order
+        batches = [base64_images[i:i + GRID_BATCH_SIZE] for i in range(0, total_images, GRID_BATCH_SIZE)]
+        results = await asyncio.gather(*(describe(batch) for batch in batches))
         
-        return descriptions
+        return [description for batch_descriptions in results for description in batch_descriptions]
     except Exception as e:
         error_msg = f"Error in analyzing grid images: {str(e)}"
         logger.error(error_msg)
@@ -83,6 +183,10 @@ async def generate_description(base64_images: List[str], audio_transcription: st
     """
     Generate a comprehensive video description combining multiple grid analyses and audio transcription.
     
+    The fixed instructions go in the system message and the grid analyses and transcript in
+    the user message. This only restructures the prompt: the instructions are well under the
+    1024 tokens needed for prompt caching, and gpt-4 does not cache prompts.
+    
     Args:
         base64_images (List[str]): List of base64 encoded grid images
         audio_transcription (str, optional): Audio transcription text
@@ -102,69 +206,48 @@ async def generate_description(base64_images: List[str], audio_transcription: st
         if task_id:
             task_tracker.update_progress(task_id, "Generating final description", 70)
             
-        combined_descriptions = "\n\n".join(grid_descriptions)
-        final_prompt = f"""
-        Based on the following video segment descriptions and audio transcription, provide a comprehensive analysis:
-
-        Video Segments Analysis:
-        {combined_descriptions}
-
-        Audio Transcription:
-        {audio_transcription if audio_transcription else "No audio transcription available."}
-
-        Provide a unified description that includes:
-        1. The speaker's actions and expressions
-        2. Any text overlays or icons and their significance
-        3. How the visuals complement or illustrate the audio content
-        4. The overall theme and message of the video
-        5. No of human being face visible in the video
-        6. Count the number of visible human faces in the video
-        7. Assess the personality traits of the main individual featured, including insights into their demeanor and engagement
-        8. Identify the gender of the main speaker at the beginning of the video, as well as the genders of all other individuals present
-        9. If possible, provide names or identities of other individuals featured in the video
-        10. Determine whether the video contains visible faces throughout its duration
-        11. Calculate the exact duration of the audio and the total length of the video based on automated processing
-        12. Describe the speaker's actions, expressions, and any notable interactions
-        13. Speaker Identification: If there are multiple speakers, indicate who is speaking at each point
-        14. Use paragraph breaks for different speakers or topics to enhance readability
-
-        Additionally, analyze the Christian content aspects:
-        15. Identify any religious symbols, scripture references, or biblical content
-        16. Note any expressions of faith, prayer, or worship
-        17. Assess if the content aligns with Christian values (love, service, humility, etc.)
-        18. Identify any religious gatherings or community events
-        19. Evaluate if the content promotes Christian teachings or messages
-        20. Determine if the content reflects Christian social media principles:
-            - Authenticity over perfection
-            - Focus on serving others rather than self-promotion
-            - Building genuine connections and community
-            - Sharing truth with grace
-            - Using platform for Kingdom purposes
-            - Maintaining depth over superficiality
-            - Promoting unity and understanding
-            - Demonstrating Christian values in presentation and message
+        # Build the user message in a single join instead of joining the grid descriptions first
+        parts = ["Video Segments Analysis:\n"]
+        for idx, grid_description in enumerate(grid_descriptions):
+            if idx:
+                parts.append("\n\n")
+            parts.append(grid_description)
+        parts.append("\n\nAudio Transcription:\n")
+        parts.append(audio_transcription if audio_transcription else "No audio transcription available.")
+        video_content = "".join(parts)
 
-        Based on these aspects, include a clear assessment of whether this can be classified as Christian content.
-        Do not mention anything about a grid or layout of the images.
-        Provide a natural, flowing narrative that combines all these elements into a coherent analysis.
-        """
-
-        # Generate final combined description
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "user",
-                    "content": final_prompt
-                }
-            ],
-            max_tokens=1500
-        )
+        # Generate final combined description, streaming it so progress moves while tokens arrive
+        chunks = []
+        async with openai_limiter.acquire():
+            stream = await client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": FINAL_PROMPT_INSTRUCTIONS
+                    },
+                    {
+                        "role": "user",
+                        "content": video_content
+                    }
+                ],
+                max_tokens=FINAL_DESCRIPTION_MAX_TOKENS,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    chunks.append(content)
+                    if task_id:
+                        progress = 70 + 5 * min(len(chunks) / FINAL_DESCRIPTION_MAX_TOKENS, 1)  # Progress from 70% to 75%
+                        task_tracker.update_progress_throttled(task_id, "Streaming final description", progress)
         
         if task_id:
             task_tracker.update_progress(task_id, "Description generation completed", 75)
             
-        return response.choices[0].message.content.strip()
+        return "".join(chunks).strip()
     except Exception as e:
         error_msg = f"Error in generate_description: {str(e)}"
         logger.error(error_msg)
@@ -1,12 +1,97 @@
-from openai import AsyncOpenAI
 from app.core import task_tracker
-from app.core.config import settings
+from app.core.openai_client import client
 from app.core.logging import logger
-import json
+from app.core.rate_limiter import openai_limiter
+from app.core.cache import LRUCache
+import orjson
+import asyncio
+import hashlib
+import string
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+# Raw model replies keyed by a hash of the full request, so reprocessing the same
+# description does not pay for the same completion twice
+response_cache = LRUCache(maxsize=512, ttl=24 * 60 * 60)
 
 
+async def _create_completion(**request) -> str:
+    """
+    Run a chat completion through the shared rate limiter, serving identical
+    requests from the response cache. Only complete (non-truncated) replies are cached.
+    """
+    cache_key = hashlib.sha256(orjson.dumps(request, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    content = response_cache.get(cache_key)
+    if content is not None:
+        logger.info("Using cached model response")
+        return content
+
+    async with openai_limiter.acquire():
+        response = await client.chat.completions.create(**request)
+    choice = response.choices[0]
+    if choice.finish_reason == "stop":
+        response_cache.set(cache_key, choice.message.content)
+    return choice.message.content
+
+# Structured-extraction prompt, compiled once; $description is the only substitution
+METADATA_PROMPT_TEMPLATE = string.Template("""
+You are an expert content analyst. Analyze the following video description and extract metadata in the exact JSON structure provided below:
+
+Video Description:
+$description
+
+Extracted Metadata:
+{
+    "keywords": [
+        {"keyword":"string","weight":int}  // Extract 10 most relevant keywords with weights (1-10) and make sure atleast 5 keywords are present
+    ],
+    "topics": ["string"],  // List at least 3 key topics discussed
+    "entities": ["string"],  // Mentioned people, organizations, or objects
+    "actions": ["string"],  // Key actions described
+    "emotions": ["string"],  // Emotional tones present
+    "visual_elements": ["string"],  // Notable visual elements
+    "audio_elements": ["string"],  // Sound elements mentioned
+    "genre": "string",  // Genre of the content
+    "target_audience": ["string"],  // List of intended audiences
+    "duration_estimate": "string",  // Estimated duration in minutes:seconds
+    "quality_indicators": ["string"],  // Quality metrics or indicators
+    "unique_identifiers": ["string"],  // Unique identifiers for the video
+    "is_face_exist": bool,  // Whether faces are present in the video
+    "person_identity": {"name": "string", "gender": "string"},  // Main person identity
+    "other_person_identity": ["string"],  // Other persons' identities
+    "psychological_personality": ["string"],  // Personality traits
+    "no_of_person_in_video": int,  // Number of persons in the video if no person found then attach no_of_person_in_video = 0
+    "content_warnings": ["string"],  // List of content warnings
+    "safety_analysis": ["string"],  // Safety-related observations
+    "is_safe": bool  // Whether the content is deemed safe
+}
+
+Ensure all fields are filled based on the information available in the description.
+Return the response in valid JSON format.
+""")
+
+
+async def _run_metadata_llm(description: str) -> dict:
+    """
+    Ask the model for the structured metadata of a description and parse its JSON reply.
+    """
+    prompt = METADATA_PROMPT_TEMPLATE.substitute(description=description)
+    
+    # Make the API call
+    content = await _create_completion(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are an expert content analyzer."},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.3,
+        max_tokens=1000
+    )
+    
+    # Parse the response; the description is added here rather than echoed back by the model
+    extracted_metadata = orjson.loads(content)
+    extracted_metadata["description"] = description
+    return extracted_metadata
+
 async def extract_video_metadata(description: str, is_christian_content: bool = False, task_id: str = None) -> dict:
     """
     Extract metadata from video description using GPT-4.
@@ -20,64 +105,19 @@ async def extract_video_metadata(description: str, is_christian_content: bool =
         dict: Extracted metadata with all required fields
     """
     try:
-        # Refined prompt for structured extraction
-        prompt = f"""
-        You are an expert content analyst. Analyze the following video description and extract metadata in the exact JSON structure provided below:
-        
-        Video Description:
-        {description}
-
-        Extracted Metadata:
-        {{
-            "description": "{description}",  // Original video description
-            "keywords": [
-                {{"keyword":"string","weight":int}}  // Extract 10 most relevant keywords with weights (1-10) and make sure atleast 5 keywords are present
-            ],
-            "topics": ["string"],  // List at least 3 key topics discussed
-            "entities": ["string"],  // Mentioned people, organizations, or objects
-            "actions": ["string"],  // Key actions described
-            "emotions": ["string"],  // Emotional tones present
-            "visual_elements": ["string"],  // Notable visual elements
-            "audio_elements": ["string"],  // Sound elements mentioned
-            "genre": "string",  // Genre of the content
-            "target_audience": ["string"],  // List of intended audiences
-            "duration_estimate": "string",  // Estimated duration in minutes:seconds
-            "quality_indicators": ["string"],  // Quality metrics or indicators
-            "unique_identifiers": ["string"],  // Unique identifiers for the video
-            "is_face_exist": bool,  // Whether faces are present in the video
-            "person_identity": {{"name": "string", "gender": "string"}},  // Main person identity
-            "other_person_identity": ["string"],  // Other persons' identities
-            "psychological_personality": ["string"],  // Personality traits
-            "no_of_person_in_video": int,  // Number of persons in the video if no person found then attach no_of_person_in_video = 0
-            "content_warnings": ["string"],  // List of content warnings
-            "safety_analysis": ["string"],  // Safety-related observations
-            "is_safe": bool  // Whether the content is deemed safe
-        }}
-        
-        Ensure all fields are filled based on the information available in the description.
-        Return the response in valid JSON format.
-        """
-        
-        # Make the API call
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert content analyzer."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        
-        # Parse and return the response
-        extracted_metadata = json.loads(response.choices[0].message.content.strip())
-
+        # The metadata extraction and the Christian content analysis only depend on the
+        # description, so run them concurrently when both are needed
         if is_christian_content:
-            christian_content = await analyze_christian_content(description, task_id)
+            extracted_metadata, christian_content = await asyncio.gather(
+                _run_metadata_llm(description),
+                analyze_christian_content(description, task_id)
+            )
             extracted_metadata["is_christian_content"] = christian_content
+        else:
+            extracted_metadata = await _run_metadata_llm(description)
 
         logger.info("Extracted metadata:")
-        logger.info(json.dumps(extracted_metadata, indent=2))
+        logger.info(orjson.dumps(extracted_metadata, option=orjson.OPT_INDENT_2).decode())
         return extracted_metadata
 
     except Exception as e:
@@ -123,29 +163,30 @@ async def analyze_christian_content(description: str, task_id: str = None) -> di
         """
 
         # Call GPT model
-        response = await client.chat.completions.create(
-            model="gpt-4",  # Fixed model name
+        content = await _create_completion(
+            model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
             ],
+            response_format={"type": "json_object"},
             max_tokens=500,
             temperature=0.3
         )
 
         # Parse the response as JSON
         try:
-            result = json.loads(response.choices[0].message.content.strip())
+            result = orjson.loads(content)
             
             # Ensure "is_christian" is present
             if "is_christian" not in result:
                 result["is_christian"] = False  # Default value if missing
 
             logger.info("Christian content analysis result:")
-            logger.info(json.dumps(result, indent=2))
+            logger.info(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error parsing JSON response: {str(e)}")
             return {
                 "is_christian": False,
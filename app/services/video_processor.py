@@ -5,181 +5,231 @@ import io
 import base64
 from app.core.logging import logger
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
-from openai import AsyncOpenAI
+from typing import Awaitable, List, Tuple, Optional
 from app.core.config import settings
+from app.core.openai_client import client
 import asyncio
-from collections import defaultdict
-import tempfile
 import os
 from app.core.task_tracker import task_tracker
+from app.core.cache import LRUCache
+from app.core.rate_limiter import moderation_limiter
 import json
+import hashlib
 
-# Task queue to store processing results
-task_queue: Dict[str, Dict] = defaultdict(dict)
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+# Let FFmpeg decode with one thread per core; OpenCV defaults to a single thread
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", f"threads;{os.cpu_count() or 1}")
 
-async def split_video(video_content: bytes, task_id: str) -> List[bytes]:
+# Recent per-task moderation results; bounded so it cannot grow for the life of the process.
+# Grids are returned to the caller and deliberately not kept here.
+task_queue = LRUCache(maxsize=512, ttl=60 * 60)
+# Moderation results keyed by a hash of the grid, so resubmitted videos skip the API calls
+moderation_cache = LRUCache(maxsize=1024, ttl=24 * 60 * 60)
+
+# Grids whose difference hashes differ by at most this many bits are treated as duplicates
+GRID_HASH_DISTANCE = 5
+
+# Grids are sent as JPEG; the models only need low-frequency detail and PNG is several times larger
+GRID_JPEG_QUALITY = 80
+# Frames are downscaled to this width before tiling; the vision models resize larger grids anyway
+GRID_TILE_WIDTH = 384
+# grab() still decodes every frame it skips, so walking a part sequentially only beats
+# seeking per sample while samples sit closer together than a typical GOP (~250 frames)
+SEQUENTIAL_GRAB_MAX_INTERVAL = 250
+
+# Ultra-strict thresholds for different categories
+MODERATION_THRESHOLDS = {
+    'sexual': 0.25,            # 25%
+    'sexual/minors': 0.25,   # 25%
+    'violence': 0.25,         # 25%
+    'violence/graphic': 0.25,  # 25%
+    'harassment': 0.25,       # 25%
+    'harassment/threatening': 0.25,  # 25%
+    'hate': 0.25,            # 25%
+    'hate/threatening': 0.25,  # 25%
+    'self-harm': 0.25,        # 25%
+    'self-harm/intent': 0.25,  # 25%
+    'self-harm/instructions': 0.25,  # 25%
+    'illicit': 0.25,         # 25%
+    'illicit/violent': 0.25    # 25%
+}
+# (attribute name on the moderation result, threshold, display name) per category, built once
+MODERATION_CATEGORIES = tuple(
+    (category.replace('/', '_'), threshold, category.replace('/', ' - ').title())
+    for category, threshold in MODERATION_THRESHOLDS.items()
+)
+
+def _open_capture(path: str) -> cv2.VideoCapture:
     """
-    Split video into parts based on duration.
+    Open a video file with the FFmpeg backend so the threaded capture options apply.
+    
+    With VIDEO_HW_ACCELERATION enabled, OpenCV is asked to decode on whatever hardware
+    decoder is available (VAAPI, NVDEC, D3D11, ...); it falls back to software decoding
+    when none is.
+    """
+    if settings.VIDEO_HW_ACCELERATION:
+        return cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+    return cv2.VideoCapture(path, cv2.CAP_FFMPEG)
+
+def _split_video_sync(video_path: str) -> List[Tuple[int, int]]:
+    """
+    Compute the frame range of each part of a video.
+    
+    Opening the container and probing its properties are blocking calls, so this runs
+    in a worker thread via split_video.
     
     Args:
-        video_content (bytes): Raw video content
-        task_id (str): Unique task identifier
+        video_path (str): Path of the video file on disk
         
     Returns:
-        List[bytes]: List of video chunks in memory
+        List[Tuple[int, int]]: (start_frame, end_frame) range of each part
     """
-    temp_input_file = None
-    temp_output_file = None
+    # Open video directly from the file the caller already wrote to disk
+    video = _open_capture(video_path)
     try:
-        task_tracker.update_progress(task_id, "Saving video to temporary file", 6)
-        # First, save the input video content to a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-            temp_file.write(video_content)
-            temp_input_file = temp_file.name
-        
-        task_tracker.update_progress(task_id, "Opening video file", 7)
-        # Open video from the temporary file
-        video = cv2.VideoCapture(temp_input_file)
         if not video.isOpened():
-            raise ValueError(f"Could not open video content from {temp_input_file}")
+            raise ValueError(f"Could not open video content from {video_path}")
         
         # Get video properties
         total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
         fps = video.get(cv2.CAP_PROP_FPS)
-        duration = total_frames / fps if fps > 0 else 0
-        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        task_tracker.update_progress(task_id, "Calculating video parts", 8)
-        # Calculate number of parts (max 5)
-        minutes = duration / 60
-        num_parts = min(5, max(1, int(minutes)))
-        frames_per_part = total_frames // num_parts
-        
-        logger.info(f"Video properties: {total_frames} frames, {fps} FPS, Duration: {duration:.2f} seconds")
-        logger.info(f"Splitting into {num_parts} parts, {frames_per_part} frames per part")
-        
-        # Split video into parts
-        video_parts = []
-        progress_per_part = 7 / num_parts  # 7% progress allocated for splitting
-        
-        for i in range(num_parts):
-            task_tracker.update_progress(task_id, f"Processing video part {i+1}/{num_parts}", 8 + (i * progress_per_part))
-            
-            # Create temporary file for output chunk
-            with tempfile.NamedTemporaryFile(suffix=f'_part_{i}.mp4', delete=False) as out_file:
-                temp_output_file = out_file.name
-            
-            # Create VideoWriter object
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            writer = cv2.VideoWriter(
-                temp_output_file,
-                fourcc,
-                fps,
-                (width, height)
-            )
-            
-            start_frame = i * frames_per_part
-            end_frame = start_frame + frames_per_part if i < num_parts - 1 else total_frames
-            
-            logger.info(f"Processing part {i+1}: frames {start_frame} to {end_frame}")
-            
-            for frame_idx in range(int(start_frame), int(end_frame)):
-                video.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = video.read()
-                if ret:
-                    writer.write(frame)
-            
-            writer.release()
-            
-            # Read the chunk back and append to list
-            with open(temp_output_file, 'rb') as f:
-                video_parts.append(f.read())
-            
-            # Clean up output file
-            os.unlink(temp_output_file)
+    finally:
+        video.release()
+    
+    duration = total_frames / fps if fps > 0 else 0
+    
+    # Calculate number of parts (max 5)
+    minutes = duration / 60
+    num_parts = min(5, max(1, int(minutes)))
+    frames_per_part = total_frames // num_parts
+    
+    logger.info(f"Video properties: {total_frames} frames, {fps} FPS, Duration: {duration:.2f} seconds")
+    logger.info(f"Splitting into {num_parts} parts, {frames_per_part} frames per part")
+    
+    video_parts = []
+    for i in range(num_parts):
+        start_frame = i * frames_per_part
+        end_frame = start_frame + frames_per_part if i < num_parts - 1 else total_frames
+        logger.info(f"Part {i+1}: frames {start_frame} to {end_frame}")
+        video_parts.append((start_frame, end_frame))
+    
+    return video_parts
+
+async def split_video(video_path: str, task_id: str) -> List[Tuple[int, int]]:
+    """
+    Split video into parts based on duration.
+    
+    Only the frame range of each part is computed; frames are later decoded straight
+    from the original file, so nothing is decoded or re-encoded here.
+    
+    Args:
+        video_path (str): Path of the video file on disk
+        task_id (str): Unique task identifier
         
+    Returns:
+        List[Tuple[int, int]]: (start_frame, end_frame) range of each part
+    """
+    try:
+        task_tracker.update_progress(task_id, "Opening video file", 7)
+        video_parts = await asyncio.to_thread(_split_video_sync, video_path)
         task_tracker.update_progress(task_id, "Video splitting completed", 15)
         return video_parts
         
     except Exception as e:
         logger.error(f"Error in split_video: {str(e)}")
         raise
+
+def _sample_frames(video: cv2.VideoCapture, start_frame: int, targets: List[int], interval: int):
+    """
+    Yield (frame_pos, frame) for each target position; frame is None if it could not be read.
     
-    finally:
-        if 'video' in locals():
-            video.release()
-        # Clean up temporary files
-        if temp_input_file and os.path.exists(temp_input_file):
-            try:
-                os.unlink(temp_input_file)
-            except Exception as e:
-                logger.error(f"Error deleting temporary input file: {str(e)}")
-        if temp_output_file and os.path.exists(temp_output_file):
-            try:
-                os.unlink(temp_output_file)
-            except Exception as e:
-                logger.error(f"Error deleting temporary output file: {str(e)}")
+    With dense samples the part is walked once with grab(), retrieving only the targets.
+    grab() still fully decodes each frame it passes (it only skips the colour conversion),
+    so with sparse samples each target is sought directly instead; the seek decodes at most
+    from the previous keyframe.
+    """
+    if interval < SEQUENTIAL_GRAB_MAX_INTERVAL:
+        target_set = set(targets)
+        video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for frame_pos in range(start_frame, targets[-1] + 1):
+            if not video.grab():
+                yield frame_pos, None
+                return
+            if frame_pos in target_set:
+                ret, frame = video.retrieve()
+                yield frame_pos, frame if ret else None
+    else:
+        for frame_pos in targets:
+            video.set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
+            ret, frame = video.read()
+            yield frame_pos, frame if ret else None
 
-async def extract_frames(video_chunk: bytes) -> str:
+def _extract_frames_sync(video_path: str, start_frame: int, end_frame: int) -> Optional[str]:
     """
-    Extract frames from a video chunk and create a grid visualization.
+    Extract frames from one part of a video and create a grid visualization.
     
     Args:
-        video_chunk (bytes): Video chunk content
+        video_path (str): Path of the video file on disk
+        start_frame (int): First frame of the part
+        end_frame (int): Frame after the last frame of the part
         
     Returns:
         str: Base64 encoded grid image
     """
-    temp_file = None
     try:
-        # Save video chunk to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp:
-            temp.write(video_chunk)
-            temp_file = temp.name
-        
-        # Open video from temporary file
-        video = cv2.VideoCapture(temp_file)
+        video = _open_capture(video_path)
         if not video.isOpened():
-            raise ValueError(f"Could not open video chunk from {temp_file}")
+            raise ValueError(f"Could not open video content from {video_path}")
         
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        if total_frames == 0:
-            raise ValueError("Video chunk contains no frames")
+        total_frames = end_frame - start_frame
+        if total_frames <= 0:
+            raise ValueError("Video part contains no frames")
             
         interval = max(1, total_frames // 16)
-        logger.info(f"Extracting frames from chunk: {total_frames} total frames, interval {interval}")
+        logger.info(f"Extracting frames from part {start_frame}-{end_frame}: {total_frames} total frames, interval {interval}")
         
-        frames = []
-        for i in range(16):
-            frame_pos = min(i * interval, total_frames - 1)  # Ensure we don't exceed total frames
-            video.set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
-            ret, frame = video.read()
-            if ret:
-                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            else:
+        targets = sorted({start_frame + min(i * interval, total_frames - 1) for i in range(16)})
+        
+        # Downscale sampled frames straight into their tile of one preallocated 4x4 grid
+        # instead of keeping a full-resolution array per frame. The grid stays BGR, which
+        # is what cv2.imencode expects, so no colour conversion is needed at all.
+        grid = None
+        frame_count = 0
+        for frame_pos, frame in _sample_frames(video, start_frame, targets, interval):
+            if frame is None:
                 logger.warning(f"Failed to read frame at position {frame_pos}")
+                continue
+            if grid is None:
+                source_shape = frame.shape
+                tile_width = min(GRID_TILE_WIDTH, frame.shape[1])
+                tile_height = max(1, round(frame.shape[0] * tile_width / frame.shape[1]))
+                grid = np.empty((4 * tile_height, 4 * tile_width, 3), dtype=np.uint8)
+            elif frame.shape != source_shape:
+                logger.warning(f"Skipping frame at position {frame_pos} with unexpected shape {frame.shape}")
+                continue
+            row, col = divmod(frame_count, 4)
+            cv2.resize(
+                frame, (tile_width, tile_height),
+                dst=grid[row * tile_height:(row + 1) * tile_height, col * tile_width:(col + 1) * tile_width],
+                interpolation=cv2.INTER_AREA
+            )
+            frame_count += 1
         
-        if not frames:
-            logger.warning("No frames were extracted from the video chunk")
+        if not frame_count:
+            logger.warning("No frames were extracted from the video part")
             return None
             
-        logger.info(f"Successfully extracted {len(frames)} frames")
-        
-        # Create grid image
-        grid = Image.new('RGB', (frames[0].shape[1] * 4, frames[0].shape[0] * 4))
-        for i, frame in enumerate(frames):
-            img = Image.fromarray(frame)
-            x_position = (i % 4) * frames[0].shape[1]
-            y_position = (i // 4) * frames[0].shape[0]
-            grid.paste(img, (x_position, y_position))
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        grid.save(buffer, format='PNG')
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        logger.info(f"Successfully extracted {frame_count} frames")
+        
+        # Leave unfilled tiles black
+        for i in range(frame_count, 16):
+            row, col = divmod(i, 4)
+            grid[row * tile_height:(row + 1) * tile_height, col * tile_width:(col + 1) * tile_width] = 0
+        
+        # Encode with OpenCV's bundled libjpeg-turbo and convert to base64
+        ok, encoded = cv2.imencode('.jpg', grid, [cv2.IMWRITE_JPEG_QUALITY, GRID_JPEG_QUALITY])
+        if not ok:
+            raise ValueError("Failed to encode grid image")
+        return base64.b64encode(encoded).decode('utf-8')
     
     except Exception as e:
         logger.error(f"Error in extract_frames: {str(e)}")
@@ -188,89 +238,145 @@ async def extract_frames(video_chunk: bytes) -> str:
     finally:
         if 'video' in locals():
             video.release()
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except Exception as e:
-                logger.error(f"Error deleting temporary file: {str(e)}")
 
-async def check_content_moderation(base64_images: List[str]) -> Tuple[bool, List[str]]:
+async def extract_frames(video_path: str, start_frame: int, end_frame: int) -> Optional[str]:
+    """
+    Build the frame grid for one part of a video in a worker thread.
+    
+    Decoding, resizing and JPEG encoding are blocking calls that release the GIL, so
+    running them off the event loop lets the parts be processed in parallel.
+    
+    Args:
+        video_path (str): Path of the video file on disk
+        start_frame (int): First frame of the part
+        end_frame (int): Frame after the last frame of the part
+        
+    Returns:
+        str: Base64 encoded grid image
+    """
+    return await asyncio.to_thread(_extract_frames_sync, video_path, start_frame, end_frame)
+
+def _grid_hash(base64_grid: str) -> int:
+    """
+    Compute a 64-bit difference hash (dHash) of a base64 encoded grid image.
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(base64_grid))).convert('L').resize((9, 8))
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def _dedupe_step(base64_grid: str, last_hash: Optional[int]) -> Tuple[bool, Optional[int]]:
+    """
+    Decide whether a grid repeats the previously kept grid.
+    
+    Static videos (slides, title cards, talking heads) often yield the same grid for
+    every part; each duplicate would otherwise cost a vision call. The hash is too coarse
+    to tell single tiles apart, so it only trims the description input; every grid is
+    still moderated.
+    
+    Args:
+        base64_grid (str): Base64 encoded grid image
+        last_hash (Optional[int]): Hash of the previously kept grid, if any
+        
+    Returns:
+        Tuple[bool, Optional[int]]: Whether to keep the grid, and the hash to compare the next grid against
+    """
+    try:
+        grid_hash = _grid_hash(base64_grid)
+    except Exception as e:
+        logger.error(f"Error hashing grid image: {str(e)}")
+        return True, last_hash
+    
+    if last_hash is not None and bin(grid_hash ^ last_hash).count('1') <= GRID_HASH_DISTANCE:
+        return False, last_hash
+    return True, grid_hash
+
+async def _moderate_image(base64_image: str):
+    """
+    Run one grid image through the moderation endpoint.
+    
+    Identical grids are served from the moderation cache.
+    
+    Args:
+        base64_image (str): Base64 encoded grid image
+        
+    Returns:
+        The moderation result for the image
+    """
+    cache_key = hashlib.blake2b(base64_image.encode(), digest_size=16).hexdigest()
+    cached_result = moderation_cache.get(cache_key)
+    if cached_result is not None:
+        logger.info(f"Using cached moderation result for grid {cache_key}")
+        return cached_result
+    
+    async with moderation_limiter.acquire():
+        response = await client.moderations.create(
+            model="omni-moderation-latest",
+            input=[{
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64_image}"
+                }
+            }]
+        )
+    result = response.results[0]
+    moderation_cache.set(cache_key, result)
+    return result
+
+async def check_content_moderation(base64_images: List[str], pending_results: Optional[List[Awaitable]] = None) -> Tuple[bool, List[str]]:
     """
     Ultra-strict content moderation using OpenAI's moderation API.
     Extremely conservative thresholds for all categories.
+    
+    Args:
+        base64_images (List[str]): Base64 encoded grid images
+        pending_results (Optional[List[Awaitable]]): Moderation calls the caller already
+            started for these images; when given, they are awaited instead of new calls
+        
+    Returns:
+        Tuple[bool, List[str]]: Whether the content is safe, and the warnings found
     """
     try:
         all_warnings = []
         is_safe = True
         
-        # Ultra-strict thresholds for different categories
-        thresholds = {
-            'sexual': 0.25,            # 25%
-            'sexual/minors': 0.25,   # 25%
-            'violence': 0.25,         # 25%
-            'violence/graphic': 0.25,  # 25%
-            'harassment': 0.25,       # 25%
-            'harassment/threatening': 0.25,  # 25%
-            'hate': 0.25,            # 25%
-            'hate/threatening': 0.25,  # 25%
-            'self-harm': 0.25,        # 25%
-            'self-harm/intent': 0.25,  # 25%
-            'self-harm/instructions': 0.25,  # 25%
-            'illicit': 0.25,         # 25%
-            'illicit/violent': 0.25    # 25%
-        }
+        # The moderation endpoint takes one image per request, so send them concurrently,
+        # bounded by the limiter so long videos don't fan out into a burst of 429s
+        if pending_results is None:
+            pending_results = [_moderate_image(base64_image) for base64_image in base64_images]
+        results = await asyncio.gather(*pending_results)
         
-        # Process each image individually
-        for idx, base64_image in enumerate(base64_images):
-            response = await client.moderations.create(
-                model="omni-moderation-latest",
-                input=[{
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{base64_image}"
-                    }
-                }]
-            )
-            
-            result = response.results[0]
+        # Process each image's result individually
+        for result in results:
             
             # Check if content is flagged by any category
             if result.flagged:
                 is_safe = False
                 all_warnings.append("SYSTEM FLAG - Content flagged by moderation system")
             
-            # Check all categories with their specific thresholds
-            for category in thresholds.keys():
+            # Check all categories with their specific thresholds in one pass
+            for category_key, threshold, display_category in MODERATION_CATEGORIES:
                 # Get score safely using getattr
-                score = getattr(result.category_scores, category.replace('/', '_'), 0.0)
+                score = getattr(result.category_scores, category_key, 0.0)
                 
-                if not isinstance(score, (int, float)):
+                if not isinstance(score, (int, float)) or score < threshold:
                     continue
                 
-                threshold = thresholds[category]
-                display_category = category.replace('/', ' - ').title()
+                is_safe = False
+                if score > 0.7:
+                    severity = "CRITICAL"
+                elif score > 0.4:
+                    severity = "HIGH"
+                elif score > 0.2:
+                    severity = "MEDIUM"
+                else:
+                    # pass
+                    severity = "LOW" # In low if confidence is below 25% then it is safe
+                all_warnings.append(f"{severity} RISK - {display_category} detected (confidence: {score:.1%})")
                 
-                if score >= threshold:
-                    is_safe = False
-                    if score > 0.7:
-                        severity = "CRITICAL"
-                    elif score > 0.4:
-                        severity = "HIGH"
-                    elif score > 0.2:
-                        severity = "MEDIUM"
-                    else:
-                        # pass
-                        severity = "LOW" # In low if confidence is below 25% then it is safe
-                    all_warnings.append(f"{severity} RISK - {display_category} detected (confidence: {score:.1%})")
-            
-            # Check applied input types for additional context
-            for category in thresholds.keys():
-                category_key = category.replace('/', '_')
+                # Check applied input types for additional context
                 types = getattr(result.category_applied_input_types, category_key, [])
-                score = getattr(result.category_scores, category_key, 0.0)
-                
-                if "image" in types and score >= thresholds[category]:
-                    display_category = category.replace('/', ' - ').title()
+                if "image" in types:
                     all_warnings.append(f"IMAGE SPECIFIC - {display_category} detected in visual content")
         
         # Remove duplicates while preserving order
@@ -281,16 +387,18 @@ async def check_content_moderation(base64_images: List[str]) -> Tuple[bool, List
                 seen.add(warning)
                 filtered_warnings.append(warning)
         
-        # Sort warnings by severity
+        # Sort warnings by severity, reading each warning's severity token only once
         severity_order = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3, "SYSTEM FLAG": 4}
-        filtered_warnings.sort(key=lambda x: severity_order.get(x.split()[0], 5))
+        severities = {warning: warning.split(' ', 1)[0] for warning in filtered_warnings}
+        filtered_warnings.sort(key=lambda x: severity_order.get(severities[x], 5))
+        present_severities = set(severities.values())
         
         # Add summary warnings for high-risk content
         if not is_safe:
             summary_warnings = []
-            if any("CRITICAL" in w for w in filtered_warnings):
+            if "CRITICAL" in present_severities:
                 summary_warnings.append("CRITICAL RISK - Severe content violations detected")
-            if any("HIGH" in w for w in filtered_warnings):
+            if "HIGH" in present_severities:
                 summary_warnings.append("HIGH RISK - Significant content concerns identified")
             filtered_warnings = summary_warnings + filtered_warnings
         
@@ -309,83 +417,48 @@ async def check_content_moderation(base64_images: List[str]) -> Tuple[bool, List
         logger.error(f"Error in content moderation: {str(e)}")
         return False, ["CRITICAL RISK - Error in content moderation system"]
 
-async def analyze_grid_images(base64_images: List[str], task_id: str = None) -> List[str]:
-    """
-    Analyze grid images using GPT-4 vision model.
-    """
-    try:
-        descriptions = []
-        total_images = len(base64_images)
-        
-        for idx, base64_image in enumerate(base64_images, 1):
-            if task_id:
-                progress = 65 + (idx * 5 / total_images)
-                task_tracker.update_progress(task_id, f"Analyzing grid image {idx}/{total_images}", progress)
-            
-            try:
-                response = await client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a video frame analysis expert. Describe the key visual elements, actions, and details in this frame grid."
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Analyze this grid of video frames. Focus on: main subjects, actions, visual elements, text overlays, scene composition, and any notable details."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{base64_image}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=500
-                )
-                
-                description = response.choices[0].message.content.strip()
-                descriptions.append(description)
-                
-            except Exception as e:
-                logger.error(f"Error analyzing grid image {idx}: {str(e)}")
-                descriptions.append(f"Error analyzing frame grid {idx}")
-        
-        return descriptions
-        
-    except Exception as e:
-        logger.error(f"Error in grid image analysis: {str(e)}")
-        return ["Error analyzing frame grids"]
-
-async def process_video(video_content: bytes, task_id: str) -> Tuple[bool, List[str], List[str]]:
+async def process_video(video_path: str, task_id: str) -> Tuple[bool, List[str], List[str]]:
     """
     Main video processing function that coordinates the entire workflow.
     """
+    extractions = []
+    moderations = []
     try:
         task_tracker.update_progress(task_id, "Starting video processing", 5)
         
         # Split video into parts
-        video_parts = await split_video(video_content, task_id)
+        video_parts = await split_video(video_path, task_id)
         task_tracker.update_progress(task_id, "Video split completed", 15)
         
-        # Process each part in parallel
-        tasks = [extract_frames(part) for part in video_parts]
-        base64_grids = await asyncio.gather(*tasks)
+        # Extract every part in parallel, reading frames from the original file
+        extractions = [
+            asyncio.create_task(extract_frames(video_path, start_frame, end_frame))
+            for start_frame, end_frame in video_parts
+        ]
+        
+        # Consume grids in video order as they become ready and start moderating every
+        # extracted grid while later parts are still being extracted. Near-duplicates are
+        # only dropped from the grids passed on for description; the moderation cache
+        # already makes exact repeats free
+        moderated_grids = []
+        valid_grids = []
+        last_hash = None
+        for extraction in extractions:
+            grid = await extraction
+            if grid is None:
+                continue
+            moderated_grids.append(grid)
+            moderations.append(asyncio.create_task(_moderate_image(grid)))
+            keep, last_hash = await asyncio.to_thread(_dedupe_step, grid, last_hash)
+            if keep:
+                valid_grids.append(grid)
+            else:
+                logger.info("Skipped near-duplicate grid for description")
         task_tracker.update_progress(task_id, "Frame extraction completed", 25)
         
-        # Store grids in task queue
-        task_queue[task_id]['grids'] = base64_grids
-        
-        # Filter out None values and check content moderation for all grids in one call
-        valid_grids = [grid for grid in base64_grids if grid is not None]
-        if valid_grids:
-            task_tracker.update_progress(task_id, "Starting content moderation", 30)
-            is_safe, warnings = await check_content_moderation(valid_grids)
+        if moderated_grids:
+            task_tracker.update_progress(task_id, "Finishing content moderation", 30)
+            is_safe, warnings = await check_content_moderation(moderated_grids, moderations)
             task_tracker.update_progress(task_id, "Content moderation completed", 35)
         else:
             is_safe, warnings = False, ["No valid frames extracted"]
@@ -395,12 +468,17 @@ async def process_video(video_content: bytes, task_id: str) -> Tuple[bool, List[
         print(f"\n{'='*30}\nWarnings: {warnings}\n{'='*30}")
         
         # Store results in task queue
-        task_queue[task_id]['is_safe'] = is_safe
-        task_queue[task_id]['warnings'] = warnings
+        task_queue.set(task_id, {'is_safe': is_safe, 'warnings': warnings})
         
         return is_safe, warnings, valid_grids
     
     except Exception as e:
         logger.error(f"Error in video processing: {str(e)}")
-        task_queue[task_id]['error'] = str(e)
-        return False, [f"Processing error: {str(e)}"], []
\ No newline at end of file
+        task_queue.set(task_id, {'error': str(e)})
+        return False, [f"Processing error: {str(e)}"], []
+    
+    finally:
+        # On an early exit, don't leave extractions or moderation calls running unawaited
+        for task in extractions + moderations:
+            if not task.done():
+                task.cancel()
\ No newline at end of file
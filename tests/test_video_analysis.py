@@ -1,54 +1,109 @@
 import pytest
+import pytest_asyncio
+import asyncio
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from app.main import app
+from app.api.routes import video_analysis
 import os
-import json
+import orjson
+import pathlib
 
 VIDEO_PATH = "Final1.mp4"
+# The end-to-end test runs the real pipeline (ffmpeg, Whisper, GPT); opt in with RUN_SLOW=1
+RUN_SLOW = os.getenv("RUN_SLOW") == "1"
+RESULT_POLL_ATTEMPTS = 60
+RESULT_POLL_INTERVAL = 5  # seconds
 
-@pytest.mark.asyncio
-async def test_analyze_video():
-    print("\n\n" + "="*50)
-    print("Starting test_analyze_video")
-    print("="*50 + "\n")
+@pytest.fixture(scope="module")
+def event_loop():
+    # Module-scoped async fixtures need a loop that outlives a single test
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
 
+@pytest.fixture(scope="session")
+def video_bytes():
     assert os.path.exists(VIDEO_PATH), f"Test video file not found: {VIDEO_PATH}"
+    return pathlib.Path(VIDEO_PATH).read_bytes()
 
-    file_size = os.path.getsize(VIDEO_PATH)
-    print(f"Test video file size: {file_size} bytes")
+@pytest.fixture
+def stub_analysis(monkeypatch):
+    # Contract tests only exercise the HTTP surface; replace the background pipeline
+    calls = []
+    async def fake_analyze_video_task(video_path, *args):
+        calls.append(args)
+        os.unlink(video_path)
+    monkeypatch.setattr(video_analysis, "analyze_video_task", fake_analyze_video_task)
+    return calls
 
-    with open(VIDEO_PATH, "rb") as video_file:
-        video_content = video_file.read()
-
-    print(f"Read {len(video_content)} bytes from video file")
+@pytest.fixture(scope="module")
+def sync_client():
+    # Not entered as a context manager: the shutdown hook closes the shared OpenAI
+    # HTTP client, which later tests in the same process still need
+    return TestClient(app)
 
+@pytest_asyncio.fixture(scope="module")
+async def client():
     async with AsyncClient(app=app, base_url="http://test") as ac:
-        print("Sending POST request to /api/v1/analyze_video")
-        response = await ac.post(
-            "/api/v1/analyze_video",
-            files={"video": ("Final1.mp4", video_content, "video/mp4")}
-        )
+        yield ac
+
+@pytest.mark.slow
+@pytest.mark.skipif(not RUN_SLOW, reason="end-to-end pipeline test; set RUN_SLOW=1 to run")
+@pytest.mark.asyncio
+async def test_analyze_video(client, video_bytes):
+    print("\n\n" + "="*50)
+    print("Starting test_analyze_video")
+    print("="*50 + "\n")
+
+    print(f"Test video file size: {len(video_bytes)} bytes")
+
+    print("Sending POST request to /api/v1/analyze_video")
+    response = await client.post(
+        "/api/v1/analyze_video",
+        params={"app_name": "test"},
+        files={"video": ("Final1.mp4", video_bytes, "video/mp4")}
+    )
 
     print(f"Response status code: {response.status_code}")
     print(f"Response headers: {response.headers}")
-    print(f"Response content: {response.content.decode()}")
+    print(f"Response content: {len(response.content)} bytes")
 
     assert response.status_code == 200, f"Expected status code 200, but got {response.status_code}. Response: {response.text}"
-    
-    json_response = response.json()
-    assert "description" in json_response, "Response is missing 'description' field"
-    assert "metadata" in json_response, "Response is missing 'metadata' field"
-    assert "audio_transcription" in json_response, "Response is missing 'audio_transcription' field"
+    task_id = response.json().get("task_id")
+    assert task_id, "Response is missing 'task_id' field"
+
+    # The analysis runs as a background task; poll until it finishes
+    for _ in range(RESULT_POLL_ATTEMPTS):
+        result_response = await client.get(f"/api/v1/analysis_result/{task_id}")
+        assert result_response.status_code == 200
+        json_response = result_response.json()
+        if json_response.get("status") != "pending":
+            break
+        await asyncio.sleep(RESULT_POLL_INTERVAL)
+
+    assert json_response.get("status") == "completed", f"Analysis did not complete: {json_response}"
+    assert "description" in json_response, "Result is missing 'description' field"
+    assert "is_safe" in json_response, "Result is missing 'is_safe' field"
+    assert "keywords" in json_response, "Result is missing 'keywords' field"
     
     print("\nResponse:")
-    print(json.dumps(json_response, indent=2))
+    print(orjson.dumps(json_response, option=orjson.OPT_INDENT_2).decode())
 
     print("\n" + "="*50)
     print("test_analyze_video completed")
     print("="*50 + "\n")
 
-def test_analyze_video_no_file():
-    client = TestClient(app)
-    response = client.post("/api/v1/analyze_video")
-    assert response.status_code == 422  # Unprocessable Entity
\ No newline at end of file
+def test_analyze_video_no_file(sync_client):
+    response = sync_client.post("/api/v1/analyze_video")
+    assert response.status_code == 422  # Unprocessable Entity
+
+def test_analyze_video_returns_task_id(sync_client, stub_analysis):
+    response = sync_client.post(
+        "/api/v1/analyze_video",
+        params={"app_name": "test"},
+        files={"video": ("sample.mp4", b"\x00" * 1024, "video/mp4")}
+    )
+    assert response.status_code == 200
+    assert "task_id" in response.json()
+    assert len(stub_analysis) == 1